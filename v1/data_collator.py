@@ -9,35 +9,14 @@ from transformers.utils import PaddingStrategy
 InputDataClass = NewType("InputDataClass", Any)
 DataCollator = NewType("DataCollator", Callable[[List[InputDataClass]], Dict[str, Any]])
 
-
-def pad_without_fast_tokenizer_warning(tokenizer, *pad_args, **pad_kwargs):
-    """
-    Pads without triggering the warning about how using the pad function is sub-optimal when using a fast tokenizer.
-    """
-
-    # To avoid errors when using Feature extractors
-    if not hasattr(tokenizer, "deprecation_warnings"):
-        return tokenizer.pad(*pad_args, **pad_kwargs)
-
-    # Save the state of the warning, then disable it
-    warning_state = tokenizer.deprecation_warnings.get(
-        "Asking-to-pad-a-fast-tokenizer", False
-    )
-    tokenizer.deprecation_warnings["Asking-to-pad-a-fast-tokenizer"] = True
-
-    try:
-        padded = tokenizer.pad(*pad_args, **pad_kwargs)
-    finally:
-        # Restore the state of the warning.
-        tokenizer.deprecation_warnings["Asking-to-pad-a-fast-tokenizer"] = warning_state
-
-    return padded
+FEATURE_PREFIXES = ("query", "document", "hard_negative")
 
 
 @dataclass
 class DataCollatorForKoE5(DataCollatorMixin):
     """
-    Data collator that will dynamically pad the inputs received, as well as the labels.
+    Data collator that stacks the fixed-width feature rows of [`KoE5Dataset`] into tensors and resizes them to the
+    requested padding length.
 
     Args:
         tokenizer ([`PreTrainedTokenizer`] or [`PreTrainedTokenizerFast`]):
@@ -46,13 +25,14 @@ class DataCollatorForKoE5(DataCollatorMixin):
             Select a strategy to pad the returned sequences (according to the model's padding side and padding index)
             among:
 
-            - `True` or `'longest'` (default): Pad to the longest sequence in the batch (or no padding if only a single
-              sequence is provided).
-            - `'max_length'`: Pad to a maximum length specified with the argument `max_length` or to the maximum
-              acceptable input length for the model if that argument is not provided.
-            - `False` or `'do_not_pad'`: No padding (i.e., can output a batch with sequences of different lengths).
+            - `True` or `'longest'` (default): Trim the rows to the longest sequence in the batch.
+            - `'max_length'`: Pad the rows to a maximum length specified with the argument `max_length` or to the
+              maximum acceptable input length for the model if that argument is not provided. Rows are never
+              truncated, so a batch whose longest row exceeds this length keeps its longest row's length.
+
+            `False` or `'do_not_pad'` is not supported, since the rows are always stacked into a single tensor.
         max_length (`int`, *optional*):
-            Maximum length of the returned list and optionally padding length (see above).
+            Length of the returned sequences when `padding='max_length'` (see above).
         pad_to_multiple_of (`int`, *optional*):
             If set will pad the sequence to a multiple of the provided value.
 
@@ -71,6 +51,32 @@ class DataCollatorForKoE5(DataCollatorMixin):
     label_pad_token_id: int = -100
     return_tensors: str = "pt"
 
+    def __post_init__(self):
+        if self.padding is True:
+            self.padding = PaddingStrategy.LONGEST
+        elif self.padding is False:
+            self.padding = PaddingStrategy.DO_NOT_PAD
+        else:
+            self.padding = PaddingStrategy(self.padding)
+
+        if self.padding == PaddingStrategy.DO_NOT_PAD:
+            raise ValueError(
+                "DataCollatorForKoE5 stacks features into tensors and does not support padding=False"
+            )
+
+    def _resize(self, array: np.ndarray, length: int, pad_value: int) -> np.ndarray:
+        """Trims padding columns from, or pads, the rows of `array` to `length` on the tokenizer's padding side.
+
+        `length` must not be shorter than the longest row in the batch, so only padding is ever removed.
+        """
+        width = array.shape[1]
+        left = self.tokenizer.padding_side == "left"
+        if width >= length:
+            return array[:, width - length :] if left else array[:, :length]
+
+        pad_width = ((0, 0), (length - width, 0) if left else (0, length - width))
+        return np.pad(array, pad_width, constant_values=pad_value)
+
     def torch_call(self, features):
         import torch
 
@@ -81,30 +87,38 @@ class DataCollatorForKoE5(DataCollatorMixin):
             else None
         )
 
-        # 정규 형식 (input_ids, attention_mask 로 처리한 뒤 다시 prefix (query, document, hard_negative) 붙여줌
+        # 컬럼 단위로 (query, document, hard_negative) 의 input_ids, attention_mask 를 쌓아 batch 구성
         cat_batch = {}
-        for k in ["query", "document", "hard_negative"]:
-            batch_features = [
-                {
-                    "input_ids": feature[f"{k}_input_ids"],
-                    "attention_mask": feature[f"{k}_attention_mask"],
-                }
-                for feature in features
-                if f"{k}_input_ids" in feature and f"{k}_attention_mask" in feature
-            ]
-
-            if batch_features:
-                batch = pad_without_fast_tokenizer_warning(
-                    self.tokenizer,
-                    batch_features,
-                    padding=self.padding,
-                    max_length=self.max_length,
-                    pad_to_multiple_of=self.pad_to_multiple_of,
-                    return_tensors="pt",
+        for k in FEATURE_PREFIXES:
+            input_ids_key = f"{k}_input_ids"
+            attention_mask_key = f"{k}_attention_mask"
+            if input_ids_key not in features[0] or attention_mask_key not in features[0]:
+                continue
+
+            input_ids = np.stack([feature[input_ids_key] for feature in features])
+            attention_mask = np.stack(
+                [feature[attention_mask_key] for feature in features]
+            )
+
+            # rows share the dataset-wide padded width, resize them for this batch
+            # without ever cutting into the real tokens of its longest row
+            length = int(attention_mask.sum(axis=1).max())
+            if self.padding == PaddingStrategy.MAX_LENGTH:
+                max_length = (
+                    self.max_length
+                    if self.max_length is not None
+                    else self.tokenizer.model_max_length
                 )
+                length = max(length, max_length)
+            if self.pad_to_multiple_of is not None:
+                length = -(-length // self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+            input_ids = self._resize(input_ids, length, self.tokenizer.pad_token_id)
+            attention_mask = self._resize(attention_mask, length, 0)
 
-                cat_batch[f"{k}_input_ids"] = batch["input_ids"]
-                cat_batch[f"{k}_attention_mask"] = batch["attention_mask"]
+            # features are stored as int32, the model expects int64 ids
+            cat_batch[input_ids_key] = torch.from_numpy(input_ids).long()
+            cat_batch[attention_mask_key] = torch.from_numpy(attention_mask).long()
 
         if labels is None:
             return cat_batch
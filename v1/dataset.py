@@ -2,20 +2,24 @@ import os
 import time
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional, Union
+from typing import Dict, Optional, Union
 
+import numpy as np
 import torch
 from filelock import FileLock
 from torch.utils.data import Dataset
 
 from transformers.tokenization_utils_base import PreTrainedTokenizerBase
 from transformers.utils import logging
-from transformers.data.processors.utils import InputFeatures
 from processor import KoE5MRCProcessor, convert_examples_to_features
 
 
 logger = logging.get_logger(__name__)
 
+# bump whenever the layout returned by convert_examples_to_features changes,
+# so that caches written in an older layout are rebuilt instead of loaded
+FEATURES_CACHE_VERSION = 2
+
 
 @dataclass
 class KoE5DataTrainingArguments:
@@ -57,7 +61,7 @@ class Split(Enum):
 
 class KoE5Dataset(Dataset):
     args: KoE5DataTrainingArguments
-    features: List[InputFeatures]
+    features: Dict[str, np.ndarray]
 
     def __init__(
         self,
@@ -79,7 +83,8 @@ class KoE5Dataset(Dataset):
         # Load data features from cache or dataset file
         cached_features_file = os.path.join(
             cache_dir if cache_dir is not None else args.data_dir,
-            f"cached_{mode.value}_{tokenizer.__class__.__name__}_{args.max_seq_length}",
+            f"cached_{mode.value}_{tokenizer.__class__.__name__}_{args.max_seq_length}"
+            f"_v{FEATURES_CACHE_VERSION}",
         )
 
         # Make sure only the first process in distributed training processes the dataset,
@@ -92,7 +97,8 @@ class KoE5Dataset(Dataset):
             if os.path.exists(cached_features_file) and not args.overwrite_cache:
                 logger.info("Start loading features...")
                 start = time.time()
-                self.features = torch.load(cached_features_file)
+                # the cache is a dict of numpy arrays written by this class, not a weights file
+                self.features = torch.load(cached_features_file, weights_only=False)
                 logger.info(
                     f"Loading features from cached file {cached_features_file} [took %.3f s]",
                     time.time() - start,
@@ -113,10 +119,10 @@ class KoE5Dataset(Dataset):
 
                     if limit_length is not None:
                         logger.info(f"Using limit length: {limit_length}")
-                        examples = examples[:limit_length]
+                        examples = {k: v[:limit_length] for k, v in examples.items()}
 
                     if test:
-                        examples = examples[:100]
+                        examples = {k: v[:100] for k, v in examples.items()}
                         logger.info("Test mode activated: Got 100 examples!")
 
                     self.features = convert_examples_to_features(
@@ -131,10 +137,26 @@ class KoE5Dataset(Dataset):
                     )
 
     def __len__(self):
-        return len(self.features)
-
-    def __getitem__(self, i) -> InputFeatures:
-        return self.features[i]
+        return len(self.features["query_input_ids"])
+
+    def __getitem__(self, i) -> Dict[str, np.ndarray]:
+        features = self.features
+        document_idx = features["document_idx"][i]
+        hard_negative_idx = features["hard_negative_idx"][i]
+        return {
+            "query_input_ids": features["query_input_ids"][i],
+            "query_attention_mask": features["query_attention_mask"][i],
+            "document_input_ids": features["passage_input_ids"][document_idx],
+            "document_attention_mask": features["passage_attention_mask"][
+                document_idx
+            ],
+            "hard_negative_input_ids": features["passage_input_ids"][
+                hard_negative_idx
+            ],
+            "hard_negative_attention_mask": features["passage_attention_mask"][
+                hard_negative_idx
+            ],
+        }
 
     def get_labels(self):
         return [1, 0]
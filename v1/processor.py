@@ -1,17 +1,16 @@
 import os
 import json
+import codecs
 import dataclasses
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+import orjson
 from transformers.tokenization_utils import PreTrainedTokenizer
-from transformers.utils import is_tf_available, logging
+from transformers.utils import logging
 from transformers.data.processors.utils import DataProcessor
 
-
-if is_tf_available():
-    import tensorflow as tf
-
 logger = logging.get_logger(__name__)
 
 DEPRECATION_WARNING = (
@@ -21,7 +20,7 @@ DEPRECATION_WARNING = (
 )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class InputExample:
     query: str
     positive_passage: str
@@ -32,28 +31,6 @@ class InputExample:
         return json.dumps(dataclasses.asdict(self), indent=2) + "\n"
 
 
-@dataclass
-class E5InputExample(InputExample):
-    def __init__(self, query: str, positive_passage: str, negative_passage: str):
-        super().__init__(
-            f"query: {query}",
-            f"passage: {positive_passage}",
-            f"passage: {negative_passage}",
-        )
-
-
-@dataclass(frozen=True)
-class InputFeatures:
-    # question
-    input_ids: List[int]
-    token_type_ids: List[int]
-    attention_mask: Optional[List[int]] = None
-
-    def to_json_string(self):
-        """Serializes this instance to a JSON string."""
-        return json.dumps(dataclasses.asdict(self)) + "\n"
-
-
 class KoE5MRCProcessor(DataProcessor):
     """Processor for the KoE5 data set."""
 
@@ -71,7 +48,7 @@ class KoE5MRCProcessor(DataProcessor):
 
     def get_train_examples(self, data_dir):
         """See base class."""
-        if "train.json" in os.listdir(data_dir):
+        if os.path.exists(os.path.join(data_dir, "train.json")):
             return self._create_examples(
                 self._read_json(os.path.join(data_dir, "train.json")), "train"
             )
@@ -82,7 +59,7 @@ class KoE5MRCProcessor(DataProcessor):
 
     def get_dev_examples(self, data_dir):
         """See base class."""
-        if "dev.json" in os.listdir(data_dir):
+        if os.path.exists(os.path.join(data_dir, "dev.json")):
             return self._create_examples(
                 self._read_json(os.path.join(data_dir, "dev.json")), "dev"
             )
@@ -93,7 +70,7 @@ class KoE5MRCProcessor(DataProcessor):
 
     def get_test_examples(self, data_dir):
         """See base class."""
-        if "test.json" in os.listdir(data_dir):
+        if os.path.exists(os.path.join(data_dir, "test.json")):
             return self._create_examples(
                 self._read_json(os.path.join(data_dir, "test.json")), "test"
             )
@@ -107,9 +84,12 @@ class KoE5MRCProcessor(DataProcessor):
         return ["0", "1"]
 
     def _create_examples(self, datas, set_type):
-        """Creates examples for the training, dev and test sets."""
-        examples = []
-        for i, data in enumerate(datas):
+        """Creates examples for the training, dev and test sets, as E5-prefixed text columns."""
+        queries = []
+        positives = []
+        hard_negatives = []
+
+        for data in datas:
             if isinstance(data["query"], list):
                 query = data["query"][0]
             else:
@@ -126,81 +106,102 @@ class KoE5MRCProcessor(DataProcessor):
             else:
                 hard_negative = None
 
-            examples.append(
-                E5InputExample(
-                    query=query,
-                    positive_passage=document,
-                    negative_passage=hard_negative,
-                )
-            )
+            queries.append(f"query: {query}")
+            positives.append(f"passage: {document}")
+            hard_negatives.append(f"passage: {hard_negative}")
 
-        return examples
+        return {
+            "query": queries,
+            "positive_passage": positives,
+            "negative_passage": hard_negatives,
+        }
 
     @classmethod
     def _read_json(cls, input_file):
         """Reads a tab separated value file."""
-        with open(input_file, "r", encoding="utf-8-sig") as f:
-            return json.load(f)
+        with open(input_file, "rb") as f:
+            return orjson.loads(f.read().removeprefix(codecs.BOM_UTF8))
 
-    def _read_jsonl(file_path, input_file):
+    @classmethod
+    def _read_jsonl(cls, input_file):
         """Read a JSONL file and return a list of dictionaries."""
-        data = []
-        with open(input_file, "r", encoding="utf-8-sig") as file:
-            for line in file:
-                data.append(json.loads(line))
-        return data
+        with open(input_file, "rb") as file:
+            return [orjson.loads(line.removeprefix(codecs.BOM_UTF8)) for line in file]
+
+
+def _batch_encode(
+    tokenizer: PreTrainedTokenizer,
+    texts: List[str],
+    max_length: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Tokenizes `texts` into int32 input_ids/attention_mask arrays padded to the longest sequence."""
+    # fast tokenizers already run encode_batch in Rust under this call
+    batch_encoding = tokenizer(
+        texts,
+        max_length=max_length,
+        padding="longest",
+        pad_to_multiple_of=8,
+        truncation=True,
+        return_tensors="np",
+    )
+    # int32 is wide enough for any vocabulary and halves the cached feature size
+    return (
+        batch_encoding["input_ids"].astype(np.int32),
+        batch_encoding["attention_mask"].astype(np.int32),
+    )
 
 
 def convert_examples_to_features(
-    examples: List[InputExample],
+    examples: Dict[str, List[str]],
     tokenizer: PreTrainedTokenizer,
     max_length: Optional[int] = None,
 ):
     if max_length is None:
         max_length = tokenizer.model_max_length
 
-    query_batch_encoding = tokenizer(
-        [example.query for example in examples],
-        max_length=max_length,
-        padding="max_length",
-        truncation=True,
+    num_examples = len(examples["query"])
+
+    # the same passage is often a positive for one query and a hard negative for
+    # another, so tokenize every distinct passage once and index into it per example
+    passage_to_idx: Dict[str, int] = {}
+    document_idx = [
+        passage_to_idx.setdefault(passage, len(passage_to_idx))
+        for passage in examples["positive_passage"]
+    ]
+    hard_negative_idx = [
+        passage_to_idx.setdefault(passage, len(passage_to_idx))
+        for passage in examples["negative_passage"]
+    ]
+
+    # tokenize queries and passages separately so that each is padded to its own longest sequence
+    query_input_ids, query_attention_mask = _batch_encode(
+        tokenizer, examples["query"], max_length
     )
-
-    document_batch_encoding = tokenizer(
-        [example.positive_passage for example in examples],
-        max_length=max_length,
-        padding="max_length",
-        truncation=True,
+    passage_input_ids, passage_attention_mask = _batch_encode(
+        tokenizer, list(passage_to_idx), max_length
     )
 
-    negative_batch_encoding = tokenizer(
-        [example.negative_passage for example in examples],
-        max_length=max_length,
-        padding="max_length",
-        truncation=True,
+    features = {
+        "query_input_ids": query_input_ids,
+        "query_attention_mask": query_attention_mask,
+        "passage_input_ids": passage_input_ids,
+        "passage_attention_mask": passage_attention_mask,
+        "document_idx": np.array(document_idx, dtype=np.int32),
+        "hard_negative_idx": np.array(hard_negative_idx, dtype=np.int32),
+    }
+    logger.info(
+        f"Tokenized {len(passage_to_idx)} unique passages for {num_examples} examples"
     )
 
-    features = []
-    from tqdm import tqdm
-
-    for i in tqdm(range(len(examples)), desc="Converting examples to features..."):
-        query_inputs = {k: query_batch_encoding[k][i] for k in query_batch_encoding}
-        doc_inputs = {k: document_batch_encoding[k][i] for k in document_batch_encoding}
-        neg_inputs = {k: negative_batch_encoding[k][i] for k in negative_batch_encoding}
-
-        features.append(
-            {
-                "query_input_ids": query_inputs["input_ids"],
-                "query_attention_mask": query_inputs["attention_mask"],
-                "document_input_ids": doc_inputs["input_ids"],
-                "document_attention_mask": doc_inputs["attention_mask"],
-                "hard_negative_input_ids": neg_inputs["input_ids"],
-                "hard_negative_attention_mask": neg_inputs["attention_mask"],
-            }
-        )
-
-    for i, example in enumerate(examples[:3]):
+    for i in range(min(3, num_examples)):
+        example_features = {
+            "query_input_ids": features["query_input_ids"][i],
+            "document_input_ids": features["passage_input_ids"][document_idx[i]],
+            "hard_negative_input_ids": features["passage_input_ids"][
+                hard_negative_idx[i]
+            ],
+        }
         logger.info("*** Example ***")
-        logger.info(f"features: {features[i]}")
+        logger.info(f"features: {example_features}")
 
     return features
@@ -371,7 +371,7 @@ def train(
         tokenizer=tokenizer,
         padding=True,
         max_length=None,
-        pad_to_multiple_of=None,
+        pad_to_multiple_of=8,
         label_pad_token_id=-100,
         return_tensors="pt",
     )
@@ -1,8 +1,9 @@
 import torch.nn.functional as F
 
 import os
-import json
+import functools
 import torch
+import orjson
 import logging
 import dataclasses
 from dataclasses import asdict, dataclass
@@ -11,9 +12,11 @@ from transformers import (
     PreTrainedTokenizerFast,
     BatchEncoding,
 )
-from typing import Tuple, Dict, List, Any, Optional, Mapping
+from typing import Tuple, Dict, List, Any, Optional, Mapping, Callable
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 
 def _setup_logger():
     log_format = logging.Formatter("[%(asctime)s %(levelname)s] %(message)s")
@@ -47,10 +50,12 @@ def tokenize(examples, tokenizer):
 
 
 def average_pool(last_hidden_states: Tensor, attention_mask: Tensor) -> FloatTensor:
-    last_hidden_states = last_hidden_states.masked_fill(
-        ~attention_mask[..., None].bool(), 0.0
+    # accumulate in fp32 and clamp so that rows with an empty mask pool to zeros instead of NaN
+    counts = attention_mask.sum(dim=1, keepdim=True).clamp(min=1).float()
+    summed = torch.einsum(
+        "blh,bl->bh", last_hidden_states.float(), attention_mask.float()
     )
-    return last_hidden_states.sum(dim=1) / attention_mask.sum(dim=1)[..., None]
+    return (summed / counts).to(last_hidden_states.dtype)
 
 
 def has_length(dataset):
@@ -85,177 +90,242 @@ def create_batch_dict(
             input_texts,
             max_length=max_length - 1,
             return_token_type_ids=False,
-            return_attention_mask=False,
-            padding=False,
+            padding=True,
             truncation=True,
+            return_tensors="pt",
+        )
+        input_ids = batch_dict["input_ids"]
+        attention_mask = batch_dict["attention_mask"]
+
+        # append eos_token_id to every input_ids, keeping the length a multiple of 8
+        num_pad = -(input_ids.size(1) + 1) % 8
+        if tokenizer.padding_side == "left":
+            input_ids = F.pad(input_ids, (0, 1), value=tokenizer.eos_token_id)
+            attention_mask = F.pad(attention_mask, (0, 1), value=1)
+            input_ids = F.pad(input_ids, (num_pad, 0), value=tokenizer.pad_token_id)
+            attention_mask = F.pad(attention_mask, (num_pad, 0), value=0)
+        else:
+            # eos goes right after the last real token, not after the padding
+            lengths = attention_mask.sum(dim=1, keepdim=True)
+            input_ids = F.pad(
+                input_ids, (0, num_pad + 1), value=tokenizer.pad_token_id
+            ).scatter_(1, lengths, tokenizer.eos_token_id)
+            attention_mask = F.pad(attention_mask, (0, num_pad + 1), value=0).scatter_(
+                1, lengths, 1
+            )
+
+        return BatchEncoding(
+            {"input_ids": input_ids, "attention_mask": attention_mask}
         )
 
-        # append eos_token_id to every input_ids
-        batch_dict["input_ids"] = [
-            input_ids + [tokenizer.eos_token_id]
-            for input_ids in batch_dict["input_ids"]
-        ]
 
-        return tokenizer.pad(
-            batch_dict,
-            padding=True,
-            pad_to_multiple_of=8,
-            return_attention_mask=True,
-            return_tensors="pt",
+_copy_stream: Optional[torch.cuda.Stream] = None
+
+
+def _get_copy_stream() -> torch.cuda.Stream:
+    global _copy_stream
+    if _copy_stream is None:
+        _copy_stream = torch.cuda.Stream()
+    return _copy_stream
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_unpinned_once():
+    logger.warning(
+        "move_to_cuda got a tensor that is not in pinned memory, the copy to GPU will not overlap "
+        "with compute. Enable pin_memory on the DataLoader to avoid this."
+    )
+
+
+def _tensor_to_cuda(tensor: Tensor) -> Tensor:
+    if tensor.device.type != "cpu":
+        return tensor.cuda(non_blocking=True)
+
+    # non_blocking copies only overlap with compute when the source is pinned
+    if not tensor.is_pinned():
+        _warn_unpinned_once()
+        return tensor.cuda(non_blocking=True)
+
+    compute_stream = torch.cuda.current_stream()
+    copy_stream = _get_copy_stream()
+    with torch.cuda.stream(copy_stream):
+        cuda_tensor = tensor.cuda(non_blocking=True)
+    # order the copy before later compute, and keep the allocator from reusing
+    # the memory while the compute stream reads it
+    compute_stream.wait_stream(copy_stream)
+    cuda_tensor.record_stream(compute_stream)
+    return cuda_tensor
+
+
+def _move_to_cuda(maybe_tensor):
+    move = _MOVE_TO_CUDA_DISPATCH.get(type(maybe_tensor))
+    if move is not None:
+        return move(maybe_tensor)
+
+    # subclasses of the dispatched types (e.g. BatchEncoding, nn.Parameter)
+    if torch.is_tensor(maybe_tensor):
+        return _tensor_to_cuda(maybe_tensor)
+    elif isinstance(maybe_tensor, dict):
+        return {key: _move_to_cuda(value) for key, value in maybe_tensor.items()}
+    elif isinstance(maybe_tensor, list):
+        return [_move_to_cuda(x) for x in maybe_tensor]
+    elif isinstance(maybe_tensor, tuple):
+        return tuple([_move_to_cuda(x) for x in maybe_tensor])
+    elif isinstance(maybe_tensor, Mapping):
+        return type(maybe_tensor)(
+            {k: _move_to_cuda(v) for k, v in maybe_tensor.items()}
         )
+    else:
+        return maybe_tensor
+
+
+_MOVE_TO_CUDA_DISPATCH: Dict[type, Callable[[Any], Any]] = {
+    Tensor: _tensor_to_cuda,
+    dict: lambda d: {key: _move_to_cuda(value) for key, value in d.items()},
+    list: lambda l: [_move_to_cuda(x) for x in l],
+    tuple: lambda t: tuple([_move_to_cuda(x) for x in t]),
+}
 
 
 def move_to_cuda(sample):
     if len(sample) == 0:
         return {}
 
-    def _move_to_cuda(maybe_tensor):
-        if torch.is_tensor(maybe_tensor):
-            return maybe_tensor.cuda(non_blocking=True)
-        elif isinstance(maybe_tensor, dict):
-            return {key: _move_to_cuda(value) for key, value in maybe_tensor.items()}
-        elif isinstance(maybe_tensor, list):
-            return [_move_to_cuda(x) for x in maybe_tensor]
-        elif isinstance(maybe_tensor, tuple):
-            return tuple([_move_to_cuda(x) for x in maybe_tensor])
-        elif isinstance(maybe_tensor, Mapping):
-            return type(maybe_tensor)(
-                {k: _move_to_cuda(v) for k, v in maybe_tensor.items()}
-            )
-        else:
-            return maybe_tensor
+    # fast path for the common case of a flat dict of tensors
+    if type(sample) is dict and all(type(v) is Tensor for v in sample.values()):
+        return {k: _tensor_to_cuda(v) for k, v in sample.items()}
 
     return _move_to_cuda(sample)
 
 
+_CLASSIFICATION_INSTRUCT: Dict[str, str] = {
+    "AmazonCounterfactualClassification": "Classify a given Amazon customer review text as either counterfactual or not-counterfactual",
+    "AmazonPolarityClassification": "Classify Amazon reviews into positive or negative sentiment",
+    "AmazonReviewsClassification": "Classify the given Amazon review into its appropriate rating category",
+    "Banking77Classification": "Given a online banking query, find the corresponding intents",
+    "EmotionClassification": "Classify the emotion expressed in the given Twitter message into one of the six emotions: anger, fear, joy, love, sadness, and surprise",
+    "ImdbClassification": "Classify the sentiment expressed in the given movie review text from the IMDB dataset",
+    "MassiveIntentClassification": "Given a user utterance as query, find the user intents",
+    "MassiveScenarioClassification": "Given a user utterance as query, find the user scenarios",
+    "MTOPDomainClassification": "Classify the intent domain of the given utterance in task-oriented conversation",
+    "MTOPIntentClassification": "Classify the intent of the given utterance in task-oriented conversation",
+    "ToxicConversationsClassification": "Classify the given comments as either toxic or not toxic",
+    "TweetSentimentExtractionClassification": "Classify the sentiment of a given tweet as either positive, negative, or neutral",
+    # C-MTEB eval instructions
+    "TNews": "Classify the fine-grained category of the given news title",
+    "IFlyTek": "Given an App description text, find the appropriate fine-grained category",
+    "MultilingualSentiment": "Classify sentiment of the customer review into positive, neutral, or negative",
+    "JDReview": "Classify the customer review for iPhone on e-commerce platform into positive or negative",
+    "OnlineShopping": "Classify the customer review for online shopping into positive or negative",
+    "Waimai": "Classify the customer review from a food takeaway platform into positive or negative",
+}
+
+_CLUSTERING_INSTRUCT: Dict[str, str] = {
+    "ArxivClusteringP2P": "Identify the main and secondary category of Arxiv papers based on the titles and abstracts",
+    "ArxivClusteringS2S": "Identify the main and secondary category of Arxiv papers based on the titles",
+    "BiorxivClusteringP2P": "Identify the main category of Biorxiv papers based on the titles and abstracts",
+    "BiorxivClusteringS2S": "Identify the main category of Biorxiv papers based on the titles",
+    "MedrxivClusteringP2P": "Identify the main category of Medrxiv papers based on the titles and abstracts",
+    "MedrxivClusteringS2S": "Identify the main category of Medrxiv papers based on the titles",
+    "RedditClustering": "Identify the topic or theme of Reddit posts based on the titles",
+    "RedditClusteringP2P": "Identify the topic or theme of Reddit posts based on the titles and posts",
+    "StackExchangeClustering": "Identify the topic or theme of StackExchange posts based on the titles",
+    "StackExchangeClusteringP2P": "Identify the topic or theme of StackExchange posts based on the given paragraphs",
+    "TwentyNewsgroupsClustering": "Identify the topic or theme of the given news articles",
+    # C-MTEB eval instructions
+    "CLSClusteringS2S": "Identify the main category of scholar papers based on the titles",
+    "CLSClusteringP2P": "Identify the main category of scholar papers based on the titles and abstracts",
+    "ThuNewsClusteringS2S": "Identify the topic or theme of the given news articles based on the titles",
+    "ThuNewsClusteringP2P": "Identify the topic or theme of the given news articles based on the titles and contents",
+}
+
+_RERANKING_INSTRUCT: Dict[str, str] = {
+    "AskUbuntuDupQuestions": "Retrieve duplicate questions from AskUbuntu forum",
+    "MindSmallReranking": "Retrieve relevant news articles based on user browsing history",
+    "SciDocsRR": "Given a title of a scientific paper, retrieve the titles of other relevant papers",
+    "StackOverflowDupQuestions": "Retrieve duplicate questions from StackOverflow forum",
+    "SprintDuplicateQuestions": "Retrieve duplicate questions from Sprint forum",
+    "TwitterSemEval2015": "Retrieve tweets that are semantically similar to the given tweet",
+    "TwitterURLCorpus": "Retrieve tweets that are semantically similar to the given tweet",
+    # C-MTEB eval instructions
+    "T2Reranking": "Given a Chinese search query, retrieve web passages that answer the question",
+    "MMarcoReranking": "Given a Chinese search query, retrieve web passages that answer the question",
+    "CMedQAv1": "Given a Chinese community medical question, retrieve replies that best answer the question",
+    "CMedQAv2": "Given a Chinese community medical question, retrieve replies that best answer the question",
+    "Ocnli": "Retrieve semantically similar text.",
+    "Cmnli": "Retrieve semantically similar text.",
+}
+
+_RETRIEVAL_INSTRUCT: Dict[str, str] = {
+    "ArguAna": "Given a claim, find documents that refute the claim",
+    "ClimateFEVER": "Given a claim about climate change, retrieve documents that support or refute the claim",
+    "DBPedia": "Given a query, retrieve relevant entity descriptions from DBPedia",
+    "FEVER": "Given a claim, retrieve documents that support or refute the claim",
+    "FiQA2018": "Given a financial question, retrieve user replies that best answer the question",
+    "HotpotQA": "Given a multi-hop question, retrieve documents that can help answer the question",
+    "MSMARCO": "Given a web search query, retrieve relevant passages that answer the query",
+    "NFCorpus": "Given a question, retrieve relevant documents that best answer the question",
+    "NQ": "Given a question, retrieve Wikipedia passages that answer the question",
+    "QuoraRetrieval": "Given a question, retrieve questions that are semantically equivalent to the given question",
+    "SCIDOCS": "Given a scientific paper title, retrieve paper abstracts that are cited by the given paper",
+    "SciFact": "Given a scientific claim, retrieve documents that support or refute the claim",
+    "Touche2020": "Given a question, retrieve detailed and persuasive arguments that answer the question",
+    "TRECCOVID": "Given a query on COVID-19, retrieve documents that answer the query",
+    # C-MTEB eval instructions
+    "T2Retrieval": "Given a Chinese search query, retrieve web passages that answer the question",
+    "MMarcoRetrieval": "Given a web search query, retrieve relevant passages that answer the query",
+    "DuRetrieval": "Given a Chinese search query, retrieve web passages that answer the question",
+    "CovidRetrieval": "Given a question on COVID-19, retrieve news articles that answer the question",
+    "CmedqaRetrieval": "Given a Chinese community medical question, retrieve replies that best answer the question",
+    "EcomRetrieval": "Given a user query from an e-commerce website, retrieve description sentences of relevant products",
+    "MedicalRetrieval": "Given a medical question, retrieve user replies that best answer the question",
+    "VideoRetrieval": "Given a video search query, retrieve the titles of relevant videos",
+}
+# add lower case keys to match some beir names
+_RETRIEVAL_INSTRUCT.update({k.lower(): v for k, v in _RETRIEVAL_INSTRUCT.items()})
+# other cases where lower case match still doesn't work
+_RETRIEVAL_INSTRUCT["trec-covid"] = _RETRIEVAL_INSTRUCT["TRECCOVID"]
+_RETRIEVAL_INSTRUCT["climate-fever"] = _RETRIEVAL_INSTRUCT["ClimateFEVER"]
+_RETRIEVAL_INSTRUCT["dbpedia-entity"] = _RETRIEVAL_INSTRUCT["DBPedia"]
+_RETRIEVAL_INSTRUCT["webis-touche2020"] = _RETRIEVAL_INSTRUCT["Touche2020"]
+_RETRIEVAL_INSTRUCT["fiqa"] = _RETRIEVAL_INSTRUCT["FiQA2018"]
+_RETRIEVAL_INSTRUCT["quora"] = _RETRIEVAL_INSTRUCT["QuoraRetrieval"]
+# for miracl evaluation
+_RETRIEVAL_INSTRUCT[
+    "miracl"
+] = "Given a question, retrieve Wikipedia passages that answer the question"
+
+
+def _get_retrieval_task_def(task_name: str) -> str:
+    if task_name.lower().startswith("cqadupstack"):
+        return "Given a question, retrieve detailed question descriptions from Stackexchange that are duplicates to the given question"
+
+    return _RETRIEVAL_INSTRUCT[task_name]
+
+
+_TASK_TYPE_TO_TASK_DEF: Dict[str, Callable[[str], str]] = {
+    "STS": lambda task_name: "Retrieve semantically similar text.",
+    "Summarization": lambda task_name: "Given a news summary, retrieve other semantically similar summaries",
+    "BitextMining": lambda task_name: "Retrieve parallel sentences.",
+    "Classification": _CLASSIFICATION_INSTRUCT.__getitem__,
+    "Clustering": _CLUSTERING_INSTRUCT.__getitem__,
+    "Reranking": _RERANKING_INSTRUCT.__getitem__,
+    "PairClassification": _RERANKING_INSTRUCT.__getitem__,
+    "Retrieval": _get_retrieval_task_def,
+}
+
+
+@functools.lru_cache(maxsize=None)
 def get_task_def_by_task_name_and_type(task_name: str, task_type: str) -> str:
-    if task_type in ["STS"]:
-        return "Retrieve semantically similar text."
-
-    if task_type in ["Summarization"]:
-        return "Given a news summary, retrieve other semantically similar summaries"
-
-    if task_type in ["BitextMining"]:
-        return "Retrieve parallel sentences."
-
-    if task_type in ["Classification"]:
-        task_name_to_instruct: Dict[str, str] = {
-            "AmazonCounterfactualClassification": "Classify a given Amazon customer review text as either counterfactual or not-counterfactual",
-            "AmazonPolarityClassification": "Classify Amazon reviews into positive or negative sentiment",
-            "AmazonReviewsClassification": "Classify the given Amazon review into its appropriate rating category",
-            "Banking77Classification": "Given a online banking query, find the corresponding intents",
-            "EmotionClassification": "Classify the emotion expressed in the given Twitter message into one of the six emotions: anger, fear, joy, love, sadness, and surprise",
-            "ImdbClassification": "Classify the sentiment expressed in the given movie review text from the IMDB dataset",
-            "MassiveIntentClassification": "Given a user utterance as query, find the user intents",
-            "MassiveScenarioClassification": "Given a user utterance as query, find the user scenarios",
-            "MTOPDomainClassification": "Classify the intent domain of the given utterance in task-oriented conversation",
-            "MTOPIntentClassification": "Classify the intent of the given utterance in task-oriented conversation",
-            "ToxicConversationsClassification": "Classify the given comments as either toxic or not toxic",
-            "TweetSentimentExtractionClassification": "Classify the sentiment of a given tweet as either positive, negative, or neutral",
-            # C-MTEB eval instructions
-            "TNews": "Classify the fine-grained category of the given news title",
-            "IFlyTek": "Given an App description text, find the appropriate fine-grained category",
-            "MultilingualSentiment": "Classify sentiment of the customer review into positive, neutral, or negative",
-            "JDReview": "Classify the customer review for iPhone on e-commerce platform into positive or negative",
-            "OnlineShopping": "Classify the customer review for online shopping into positive or negative",
-            "Waimai": "Classify the customer review from a food takeaway platform into positive or negative",
-        }
-        return task_name_to_instruct[task_name]
-
-    if task_type in ["Clustering"]:
-        task_name_to_instruct: Dict[str, str] = {
-            "ArxivClusteringP2P": "Identify the main and secondary category of Arxiv papers based on the titles and abstracts",
-            "ArxivClusteringS2S": "Identify the main and secondary category of Arxiv papers based on the titles",
-            "BiorxivClusteringP2P": "Identify the main category of Biorxiv papers based on the titles and abstracts",
-            "BiorxivClusteringS2S": "Identify the main category of Biorxiv papers based on the titles",
-            "MedrxivClusteringP2P": "Identify the main category of Medrxiv papers based on the titles and abstracts",
-            "MedrxivClusteringS2S": "Identify the main category of Medrxiv papers based on the titles",
-            "RedditClustering": "Identify the topic or theme of Reddit posts based on the titles",
-            "RedditClusteringP2P": "Identify the topic or theme of Reddit posts based on the titles and posts",
-            "StackExchangeClustering": "Identify the topic or theme of StackExchange posts based on the titles",
-            "StackExchangeClusteringP2P": "Identify the topic or theme of StackExchange posts based on the given paragraphs",
-            "TwentyNewsgroupsClustering": "Identify the topic or theme of the given news articles",
-            # C-MTEB eval instructions
-            "CLSClusteringS2S": "Identify the main category of scholar papers based on the titles",
-            "CLSClusteringP2P": "Identify the main category of scholar papers based on the titles and abstracts",
-            "ThuNewsClusteringS2S": "Identify the topic or theme of the given news articles based on the titles",
-            "ThuNewsClusteringP2P": "Identify the topic or theme of the given news articles based on the titles and contents",
-        }
-        return task_name_to_instruct[task_name]
-
-    if task_type in ["Reranking", "PairClassification"]:
-        task_name_to_instruct: Dict[str, str] = {
-            "AskUbuntuDupQuestions": "Retrieve duplicate questions from AskUbuntu forum",
-            "MindSmallReranking": "Retrieve relevant news articles based on user browsing history",
-            "SciDocsRR": "Given a title of a scientific paper, retrieve the titles of other relevant papers",
-            "StackOverflowDupQuestions": "Retrieve duplicate questions from StackOverflow forum",
-            "SprintDuplicateQuestions": "Retrieve duplicate questions from Sprint forum",
-            "TwitterSemEval2015": "Retrieve tweets that are semantically similar to the given tweet",
-            "TwitterURLCorpus": "Retrieve tweets that are semantically similar to the given tweet",
-            # C-MTEB eval instructions
-            "T2Reranking": "Given a Chinese search query, retrieve web passages that answer the question",
-            "MMarcoReranking": "Given a Chinese search query, retrieve web passages that answer the question",
-            "CMedQAv1": "Given a Chinese community medical question, retrieve replies that best answer the question",
-            "CMedQAv2": "Given a Chinese community medical question, retrieve replies that best answer the question",
-            "Ocnli": "Retrieve semantically similar text.",
-            "Cmnli": "Retrieve semantically similar text.",
-        }
-        return task_name_to_instruct[task_name]
-
-    if task_type in ["Retrieval"]:
-        if task_name.lower().startswith("cqadupstack"):
-            return "Given a question, retrieve detailed question descriptions from Stackexchange that are duplicates to the given question"
-
-        task_name_to_instruct: Dict[str, str] = {
-            "ArguAna": "Given a claim, find documents that refute the claim",
-            "ClimateFEVER": "Given a claim about climate change, retrieve documents that support or refute the claim",
-            "DBPedia": "Given a query, retrieve relevant entity descriptions from DBPedia",
-            "FEVER": "Given a claim, retrieve documents that support or refute the claim",
-            "FiQA2018": "Given a financial question, retrieve user replies that best answer the question",
-            "HotpotQA": "Given a multi-hop question, retrieve documents that can help answer the question",
-            "MSMARCO": "Given a web search query, retrieve relevant passages that answer the query",
-            "NFCorpus": "Given a question, retrieve relevant documents that best answer the question",
-            "NQ": "Given a question, retrieve Wikipedia passages that answer the question",
-            "QuoraRetrieval": "Given a question, retrieve questions that are semantically equivalent to the given question",
-            "SCIDOCS": "Given a scientific paper title, retrieve paper abstracts that are cited by the given paper",
-            "SciFact": "Given a scientific claim, retrieve documents that support or refute the claim",
-            "Touche2020": "Given a question, retrieve detailed and persuasive arguments that answer the question",
-            "TRECCOVID": "Given a query on COVID-19, retrieve documents that answer the query",
-            # C-MTEB eval instructions
-            "T2Retrieval": "Given a Chinese search query, retrieve web passages that answer the question",
-            "MMarcoRetrieval": "Given a web search query, retrieve relevant passages that answer the query",
-            "DuRetrieval": "Given a Chinese search query, retrieve web passages that answer the question",
-            "CovidRetrieval": "Given a question on COVID-19, retrieve news articles that answer the question",
-            "CmedqaRetrieval": "Given a Chinese community medical question, retrieve replies that best answer the question",
-            "EcomRetrieval": "Given a user query from an e-commerce website, retrieve description sentences of relevant products",
-            "MedicalRetrieval": "Given a medical question, retrieve user replies that best answer the question",
-            "VideoRetrieval": "Given a video search query, retrieve the titles of relevant videos",
-        }
-
-        # add lower case keys to match some beir names
-        task_name_to_instruct.update(
-            {k.lower(): v for k, v in task_name_to_instruct.items()}
+    if task_type not in _TASK_TYPE_TO_TASK_DEF:
+        raise ValueError(
+            f"No instruction config for task {task_name} with type {task_type}"
         )
-        # other cases where lower case match still doesn't work
-        task_name_to_instruct["trec-covid"] = task_name_to_instruct["TRECCOVID"]
-        task_name_to_instruct["climate-fever"] = task_name_to_instruct["ClimateFEVER"]
-        task_name_to_instruct["dbpedia-entity"] = task_name_to_instruct["DBPedia"]
-        task_name_to_instruct["webis-touche2020"] = task_name_to_instruct["Touche2020"]
-        task_name_to_instruct["fiqa"] = task_name_to_instruct["FiQA2018"]
-        task_name_to_instruct["quora"] = task_name_to_instruct["QuoraRetrieval"]
-
-        # for miracl evaluation
-        task_name_to_instruct[
-            "miracl"
-        ] = "Given a question, retrieve Wikipedia passages that answer the question"
-
-        return task_name_to_instruct[task_name]
-
-    raise ValueError(
-        f"No instruction config for task {task_name} with type {task_type}"
-    )
+
+    return _TASK_TYPE_TO_TASK_DEF[task_type](task_name)
 
 
+@functools.lru_cache(maxsize=None)
 def get_detailed_instruct(task_description: str) -> str:
     if not task_description:
         return ""
@@ -264,10 +334,16 @@ def get_detailed_instruct(task_description: str) -> str:
 
 
 def merge_files(file_paths, output_file):
-    merged_data = []
-    for file_path in file_paths:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            merged_data.extend(data)
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(merged_data, f, ensure_ascii=False, indent=4)
+    # stream the merged array to disk, one element per line, instead of
+    # materialising every file in a single list
+    with open(output_file, "wb") as out:
+        out.write(b"[")
+        separator = b"\n"
+        for file_path in file_paths:
+            with open(file_path, "rb") as f:
+                data = orjson.loads(f.read())
+            for item in data:
+                out.write(separator)
+                out.write(orjson.dumps(item))
+                separator = b",\n"
+        out.write(b"\n]\n")